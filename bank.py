@@ -0,0 +1,218 @@
+"""Pre-rendered instrument banks.
+
+A bank is a single file with all the notes of some instruments rendered
+in advance, so that a render node can memory-map it and only decode the
+notes that a score actually uses.
+
+File layout (all integers are little-endian)::
+
+    magic      8 bytes   b'MUSBANK1'
+    index      8 bytes   uint64 offset of the JSON index
+    data       ...       the encoded notes, each aligned to 16 bytes
+    index      ...       JSON: samplerate, dtype and the offset table
+
+Each entry of the offset table has the instrument name, freq (null for
+drums), duration, offset (in bytes from the start of the file), number
+of frames and the gain to apply when decoding.
+
+To render a score from a bank:
+
+    python bank.py export notes.bank
+    python bank.py play notes.bank ezio3 out.wav
+"""
+import json
+import struct
+import inspect
+from functools import lru_cache
+
+import numpy as np
+
+import music
+from synth import Synth, AsyncSynth, SAMPLERATE, render
+from instruments import default_tone, violin, bass, kick, kick_hard, snare, hh
+
+
+MAGIC = b'MUSBANK1'
+HEADER = struct.Struct('<8sQ')
+ALIGN = 16
+
+DTYPES = {'int16': np.int16, 'float16': np.float16}
+
+# durations used by the scores: a few multiples of a beat at their tempos
+TEMPOS = [120, 300, 400, 600, 700, 900]
+DURATIONS = sorted({60 / tempo * beats for tempo in TEMPOS
+                    for beats in (1, 2, 4)})
+
+INSTRUMENTS = [default_tone, violin, bass]
+DRUMS = [kick, kick_hard, snare, hh]
+
+
+def bank_key(instrument, freq, duration):
+    """Return the key used to look up a note in a bank."""
+    name = instrument if isinstance(instrument, str) else instrument.__name__
+    freq = None if freq is None else round(float(freq), 6)
+    return (name, freq, round(float(duration), 6))
+
+
+def encode(wave, dtype):
+    """Return the encoded wave and the gain needed to decode it."""
+    if dtype == 'float16':
+        return wave.astype(np.float16), 1.0
+    peak = float(np.max(np.abs(wave), initial=0))
+    if not peak:
+        return np.zeros(len(wave), np.int16), 1.0
+    return np.int16(np.rint(wave * (32767 / peak))), peak / 32767
+
+
+def export_bank(filename, instruments=INSTRUMENTS, drums=DRUMS,
+                durations=DURATIONS, freqs=None, dtype='int16',
+                samplerate=SAMPLERATE):
+    """Render all the notes of the given instruments and drums to a bank."""
+    if dtype not in DTYPES:
+        raise ValueError(f'unsupported dtype {dtype!r}')
+    if freqs is None:
+        freqs = sorted(set(music.notes.values()))
+    notes = [(instrument, freq, duration) for instrument in instruments
+             for freq in freqs for duration in durations]
+    notes += [(drum, None, duration) for drum in drums
+              for duration in durations]
+    entries = []
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0))
+        for instrument, freq, duration in notes:
+            if freq is None:
+                wave = instrument(duration, samplerate)
+            else:
+                wave = instrument(freq, duration, samplerate)
+            data, gain = encode(wave, dtype)
+            f.write(bytes(-f.tell() % ALIGN))
+            name, freq, duration = bank_key(instrument, freq, duration)
+            entries.append({'instrument': name, 'freq': freq,
+                            'duration': duration, 'offset': f.tell(),
+                            'frames': len(data), 'gain': gain})
+            f.write(data.tobytes())
+        index_offset = f.tell()
+        index = {'samplerate': samplerate, 'dtype': dtype, 'entries': entries}
+        f.write(json.dumps(index).encode('utf-8'))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, index_offset))
+    return len(entries)
+
+
+class SampleBank:
+    """A memory-mapped bank; notes are decoded when they are requested."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            magic, index_offset = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f'{filename} is not a sample bank')
+            f.seek(index_offset)
+            index = json.loads(f.read().decode('utf-8'))
+        self.samplerate = index['samplerate']
+        self.dtype = index['dtype']
+        self.data = np.memmap(filename, dtype=np.uint8, mode='r',
+                              shape=(index_offset,))
+        self.entries = {
+            (e['instrument'], e['freq'], e['duration']): e
+            for e in index['entries']
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return bank_key(*key) in self.entries
+
+    def get(self, instrument, freq, duration):
+        """Decode and return a note, or raise KeyError."""
+        entry = self.entries[bank_key(instrument, freq, duration)]
+        itemsize = np.dtype(DTYPES[self.dtype]).itemsize
+        start = entry['offset']
+        raw = self.data[start:start + entry['frames'] * itemsize]
+        return np.multiply(raw.view(DTYPES[self.dtype]), entry['gain'],
+                           dtype=np.float64)
+
+    def lookup(self, instrument, freq, duration, samplerate):
+        """Return a note from the bank, or None if it's not there."""
+        if samplerate != self.samplerate:
+            return None
+        try:
+            return self.get(instrument, freq, duration)
+        except KeyError:
+            return None
+
+    def instrument(self, instrument):
+        """Return instrument, reading its notes from the bank when possible.
+
+        Notes missing from the bank are rendered as usual.
+        """
+        if 'freq' in inspect.signature(instrument).parameters:
+            @lru_cache()
+            def banked(freq, duration, samplerate=SAMPLERATE):
+                wave = self.lookup(instrument, freq, duration, samplerate)
+                if wave is None:
+                    wave = instrument(freq, duration, samplerate)
+                return wave
+        else:  # drums
+            @lru_cache()
+            def banked(duration, samplerate=SAMPLERATE):
+                wave = self.lookup(instrument, None, duration, samplerate)
+                if wave is None:
+                    wave = instrument(duration, samplerate)
+                return wave
+        banked.__name__ = instrument.__name__
+        return banked
+
+
+class BankSynth(Synth):
+    """A synth that takes the notes of the events from a bank."""
+
+    def __init__(self, output, bank, rng=None, seed=None):
+        super().__init__(output, rng=rng, seed=seed)
+        self.bank = bank
+
+    def render(self, wave):
+        if isinstance(wave, music.Event):
+            note = self.bank.lookup(wave.instrument, wave.freq, wave.duration,
+                                    SAMPLERATE)
+            if note is not None:
+                return note
+        return render(wave)
+
+
+class AsyncBankSynth(BankSynth, AsyncSynth):
+    """BankSynth for async scores."""
+
+
+if __name__ == '__main__':
+    import argparse
+    from functools import partial
+    from synth import load_score, run_synth
+    parser = argparse.ArgumentParser(
+        description='Export an instrument bank, or play a score from one.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='export a bank')
+    export.add_argument('filename')
+    export.add_argument('--dtype', choices=DTYPES, default='int16')
+    export.add_argument('--durations', type=float, nargs='+',
+                        default=DURATIONS)
+    play = commands.add_parser('play', help='play a score from a bank')
+    play.add_argument('filename')
+    play.add_argument('score')
+    play.add_argument('output', nargs='?', help='wav file')
+    play.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    if args.command == 'export':
+        count = export_bank(args.filename, durations=args.durations,
+                            dtype=args.dtype)
+        print(f'exported {count} notes to {args.filename}')
+    else:
+        make_music = load_score(args.score)
+        if inspect.iscoroutinefunction(make_music):
+            synth_class = AsyncBankSynth
+        else:
+            synth_class = BankSynth
+        bank = SampleBank(args.filename)
+        run_synth(make_music, output=args.output, seed=args.seed,
+                  synth_class=partial(synth_class, bank=bank))
@@ -2,8 +2,14 @@ from functools import lru_cache
 
 import numpy as np
 
-from synth import (SAMPLERATE, sine_wave, envelope_ms, release_time,
-                   lowpass_noise, bandpass_noise)
+from synth import (SAMPLERATE, sine_wave, harmonic_wave, envelope_ms,
+                   release_time, lowpass_noise, bandpass_noise)
+
+
+def vectorized(instrument):
+    """Mark an instrument that also takes a column of frequencies."""
+    instrument.vectorized = True
+    return instrument
 
 
 @lru_cache()
@@ -11,6 +17,7 @@ def silence(duration, samplerate=SAMPLERATE):
     return np.zeros(int(duration*samplerate))
 
 
+@vectorized
 @lru_cache()
 def default_tone(freq, duration, samplerate=SAMPLERATE):
     # # high freq att:
@@ -28,35 +35,32 @@ def default_tone(freq, duration, samplerate=SAMPLERATE):
         (0.5, 0.2),
         (0.25, 0.1),
     ]
-    wave = sine_wave(duration, 0, 0)
-    for fm, am in harmonics:
-        wave += sine_wave(duration, freq * fm, ampl * am, samplerate)
+    wave = harmonic_wave(duration, freq, harmonics, ampl, samplerate)
     atk = 15
     dcy = 20
     sus = 0.6
-    rel = release_time(atk, dcy, len(wave))
+    rel = release_time(atk, dcy, wave.shape[-1])
     #return wave * envelope(0.1, 0.2, 0.6, 0.2, len(wave))
-    return wave * envelope_ms(atk, dcy, sus, rel, len(wave))
+    return wave * envelope_ms(atk, dcy, sus, rel, wave.shape[-1])
 
 
+@vectorized
 @lru_cache()
 def bass(freq, duration, samplerate=SAMPLERATE):
     ampl = 0.5
-    bass_wave = sine_wave(duration, 0, 1)
     harmonics = [
         (0.125, 0.5),
         (0.25, 0.3),
         (0.5, 0.03),
         (1.0, 0.01)
     ]
-    for fm, am in harmonics:
-        bass_wave += sine_wave(duration, freq * fm, ampl * am)
+    bass_wave = harmonic_wave(duration, freq, harmonics, ampl, samplerate)
 
     atk = 10
     dcy = 0
     sus = 1
-    rel = release_time(atk, dcy, len(bass_wave))
-    bass_wave *= envelope_ms(atk, dcy, sus, rel, len(bass_wave))
+    rel = release_time(atk, dcy, bass_wave.shape[-1])
+    bass_wave *= envelope_ms(atk, dcy, sus, rel, bass_wave.shape[-1])
 
     # pick_wave = sine_wave(duration, freq, ampl * 0.01)
     # pick_wave += sine_wave(duration, freq * 2, ampl * 0.005)
@@ -70,6 +74,7 @@ def bass(freq, duration, samplerate=SAMPLERATE):
     return bass_wave # + pick_wave
 
 
+@vectorized
 @lru_cache()
 def violin(freq, duration, samplerate=SAMPLERATE):
     ampl = 0.3
@@ -83,16 +88,15 @@ def violin(freq, duration, samplerate=SAMPLERATE):
         (0.5, 0.3),   # octave
         (1.25, 0.1),  # octave
     ]
-    wave = sine_wave(duration, 0, 0)
-    for fm, am in harmonics:
-        wave += sine_wave(duration, freq * fm, ampl * am, samplerate)
+    wave = harmonic_wave(duration, freq, harmonics, ampl, samplerate)
     atk = 120
     dcy = 30
     sus = 0.8
-    rel = release_time(atk, dcy, len(wave))
-    return wave * envelope_ms(atk, dcy, sus, rel, len(wave))
+    rel = release_time(atk, dcy, wave.shape[-1])
+    return wave * envelope_ms(atk, dcy, sus, rel, wave.shape[-1])
 
 
+@vectorized
 @lru_cache()
 def banjo(freq, duration, samplerate=SAMPLERATE):
     ampl = 0.38
@@ -104,16 +108,15 @@ def banjo(freq, duration, samplerate=SAMPLERATE):
         (0.75, 0.2),  # perfect fifth
         (0.25, 0.3),  # octave
     ]
-    wave = sine_wave(duration, 0, 0)
-    for fm, am in harmonics:
-        wave += sine_wave(duration, freq * fm, ampl * am, samplerate)
+    wave = harmonic_wave(duration, freq, harmonics, ampl, samplerate)
     atk = 0
     dcy = 1
     sus = 0.9
-    rel = release_time(atk, dcy, len(wave))
-    return wave * envelope_ms(atk, dcy, sus, rel, len(wave))
+    rel = release_time(atk, dcy, wave.shape[-1])
+    return wave * envelope_ms(atk, dcy, sus, rel, wave.shape[-1])
 
 
+@vectorized
 @lru_cache()
 def metallic_ufo(freq, duration, samplerate=SAMPLERATE):
     ampl = 0.5
@@ -135,14 +138,12 @@ def metallic_ufo(freq, duration, samplerate=SAMPLERATE):
         (0.25, 0.15),
         (0.125, 0.15),
     ]
-    wave = sine_wave(duration, 0, 0)
-    for fm, am in harmonics:
-        wave += sine_wave(duration, freq * fm, ampl * am, samplerate)
+    wave = harmonic_wave(duration, freq, harmonics, ampl, samplerate)
     atk = 1
     dcy = 1
     sus = 0.8
-    rel = release_time(atk, dcy, len(wave))
-    return wave * envelope_ms(atk, dcy, sus, rel, len(wave))
+    rel = release_time(atk, dcy, wave.shape[-1])
+    return wave * envelope_ms(atk, dcy, sus, rel, wave.shape[-1])
 
 
 
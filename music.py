@@ -1,19 +1,33 @@
-from itertools import cycle, repeat, chain, islice
+from collections import namedtuple
+from functools import lru_cache
+from itertools import cycle, repeat, chain, islice, accumulate, product
+
+import numpy as np
 
 from instruments import default_tone, kick, silence
 
 
+class Event(namedtuple('Event', 'instrument freq duration')):
+    """A note that the synth will render; freq is None for drums."""
+    __slots__ = ()
+
+    def render(self):
+        if self.freq is None:
+            return self.instrument(self.duration)
+        return self.instrument(self.freq, self.duration)
+
+
 def play_sequence(sequence, instrument=default_tone):
     for freq, duration in sequence:
-        yield instrument(freq, duration)
+        yield Event(instrument, freq, duration)
 
 
 def play_drumbase(beats, duration, drum=kick):
     for x in beats:
         if x:
-            yield drum(duration)
+            yield Event(drum, None, duration)
         else:
-            yield silence(duration)
+            yield Event(silence, None, duration)
 
 
 def tone(n, base_freq=440.0):
@@ -66,6 +80,113 @@ next_notes = {
 }
 
 
+# Numeric pitches: the pitch class of a note name is the number of
+# semitones from C (e.g. Cb is -1 and B# is 12, so that they belong to
+# the right octave), and MIDI numbers go from 0 (C-1) to 127 (G9).
+letters = 'CDEFGAB'
+letter_pitch_classes = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+accidentals = {'': 0, '#': 1, 'b': -1, '##': 2, 'bb': -2}
+
+
+def pitch_class(name):
+    """Return the number of semitones between C and the note name."""
+    return letter_pitch_classes[name[0]] + accidentals[name[1:]]
+
+
+def midi_number(name, octave):
+    """Return the MIDI number of the note name at the given octave."""
+    return check_midi(12 * (octave + 1) + pitch_class(name))
+
+
+def check_midi(midi):
+    """Return midi (a number or an array), or raise ValueError if any
+    MIDI number is out of the 0-127 range."""
+    if np.any((np.asarray(midi) < 0) | (np.asarray(midi) > 127)):
+        raise ValueError(f'MIDI number out of range: {midi}')
+    return midi
+
+
+def fifths_tuning(fifth, lowest):
+    """Return the ratios from C of the 12 notes of a tuning built by
+    stacking 12 fifths, starting `lowest` fifths below C."""
+    ratios = np.empty(12)
+    for k in range(lowest, lowest+12):
+        ratio = fifth ** k
+        ratios[7*k % 12] = ratio / 2 ** np.floor(np.log2(ratio))
+    return ratios
+
+
+# ratios from C of the 12 notes, for some tunings (see resources.rst)
+tunings = {
+    '12-TET': 2 ** (np.arange(12) / 12),
+    'pythagorean': fifths_tuning(3/2, -5),      # Db to F#
+    'meantone': fifths_tuning(5 ** (1/4), -3),  # quarter-comma, Eb to G#
+}
+
+
+@lru_cache()
+def frequency_table(tuning='12-TET', base_freq=440.0):
+    """Return the frequencies of the MIDI notes, with A4 at base_freq."""
+    if tuning == '12-TET':
+        # same values as tone(), so that they match the notes dict
+        table = np.array([tone(m - 69, base_freq) for m in range(128)])
+    else:
+        midi = np.arange(128)
+        ratios = tunings[tuning]
+        table = (base_freq * ratios[midi % 12] / ratios[9]
+                 * 2.0 ** (midi // 12 - 5))
+    table.setflags(write=False)
+    return table
+
+
+def spell(pc, letter):
+    """Return the name of the pitch class pc that uses the given letter,
+    or None if that would need more than one accidental."""
+    accidental = (pc - letter_pitch_classes[letter] + 6) % 12 - 6
+    if abs(accidental) > 1:
+        return None
+    return letter + {-1: 'b', 0: '', 1: '#'}[accidental]
+
+
+# names used to break ties between equally good spellings
+preferred_names = ['C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'G#', 'A', 'Bb', 'B']
+
+
+def spell_scale(key, intervals):
+    """Return the names of the notes of a scale, including the octave.
+
+    Heptatonic scales use each letter once; shorter scales skip some
+    letters and longer ones repeat some.  Among the valid spellings, the
+    one with fewest accidentals is chosen, then the one closer to the
+    preferred_names.
+    """
+    n = len(intervals)
+    pcs = list(accumulate([pitch_class(key), *intervals]))
+    if n < 7:
+        steps = [1, 2, 3]
+    elif n > 7:
+        steps = [0, 1]
+    else:
+        steps = [1]
+    start = letters.index(key[0])
+    best, best_cost = None, None
+    for letter_steps in product(steps, repeat=n):
+        if sum(letter_steps) != 7:
+            continue
+        positions = accumulate([start, *letter_steps])
+        names = [spell(pc, letters[pos % 7]) for pc, pos in zip(pcs, positions)]
+        if None in names:
+            continue
+        cost = (sum(len(name) for name in names),
+                sum(name != preferred_names[pc % 12]
+                    for name, pc in zip(names, pcs)))
+        if best_cost is None or cost < best_cost:
+            best, best_cost = names, cost
+    if best is None:
+        raise ValueError(f'cannot spell the scale {intervals} from {key}')
+    return best
+
+
 class Note:
     """A note with a name and no frequency/duration."""
     def __init__(self, note):
@@ -81,9 +202,15 @@ class Note:
     def next_note(self, interval):
         # this assumes heptatonic scales
         return Note(next_notes[self.note][interval])
-    def get_freq(self, octave):
+    @property
+    def pitch_class(self):
+        return pitch_class(self.note)
+    def midi(self, octave):
+        """Return the MIDI number of the note at the given octave."""
+        return midi_number(self.note, octave)
+    def get_freq(self, octave, tuning='12-TET', base_freq=440.0):
         """Return the frequency of the note at the given octave."""
-        return notes[f'{self.note}{octave}']
+        return float(frequency_table(tuning, base_freq)[self.midi(octave)])
 
 
 # intervals for some common scales
@@ -98,7 +225,6 @@ intervals = {
     'pentatonic major': [2, 2, 3, 2, 3],
 }
 
-# currently only works with heptatonic scales
 class Scale:
     def __init__(self, key, scale, mode=1):
         self.key, self.scale, self.mode = key, scale, mode
@@ -106,26 +232,24 @@ class Scale:
         scale_intervals = intervals[scale]
         self.intervals = list(islice(cycle(scale_intervals), mode,
                                      mode+len(scale_intervals)))
-        notes = [Note(key)]
-        for i in self.intervals:
-            notes.append(notes[-1].next_note(i))
-        self.notes = notes
-    #def __init__(self, key, scale, mode):
-        #self.key, self.scale, self.mode = key, scale, mode
-        #mode -= 1  # start from 0
-        #scale_intervals = intervals[scale]
-        #self.intervals = list(islice(cycle(scale_intervals), mode,
-                                     #mode+len(scale_intervals)))
-        #offsets = [0, *self.intervals]
-        #sharps = names_sharp * 2
-        #flats = names_flat * 2
-        #key_offset = sharps.index(key) if key in sharps else flats.index(key)
-        #self.notes = [sharps[key_offset+k] for k in accumulate(offsets)]
-        #print(self.notes)
-        #if any(note[0] in self.notes for note in self.notes if '#' in note):
-            #self.notes = [flats[key_offset+k] for k in accumulate(offsets)]
+        self.notes = [Note(n) for n in spell_scale(str(key), self.intervals)]
+        # pitch classes of the note names, so that notes[i] at octave o
+        # is the MIDI note 12 * (o + 1) + pitch_classes[i]
+        self.pitch_classes = np.array([n.pitch_class for n in self.notes])
+    def midi(self, octave):
+        """Return the MIDI numbers of the notes at the given octave(s).
+
+        If octave is a sequence, return an array with a row per octave.
+        """
+        octave = np.asarray(octave)
+        return check_midi(12 * (octave[..., np.newaxis] + 1)
+                          + self.pitch_classes)
+    def get_freqs(self, octave, tuning='12-TET', base_freq=440.0):
+        """Return the frequencies of the notes at the given octave(s)."""
+        return frequency_table(tuning, base_freq)[self.midi(octave)]
     def __repr__(self):
-        modes = {1: 'I', 2: 'II', 3: 'III', 4: 'IV', 5: 'V', 6: 'VI', 7: 'VII'}
+        modes = {1: 'I', 2: 'II', 3: 'III', 4: 'IV', 5: 'V', 6: 'VI', 7: 'VII',
+                 8: 'VIII'}
         notes = " ".join(map(str, self.notes))
         return (f'<Scale key={self.key!r} scale={self.scale!r} '
                 f'mode={modes[self.mode]!r} notes={notes!r}>')
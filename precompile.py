@@ -0,0 +1,119 @@
+"""Precompile a score: prerender its notes before playback starts.
+
+The scores draw their notes from small vocabularies, so after recording a
+few phrases of a score we know (almost) every note it will ever play.
+Those notes are rendered in advance, in batches of notes with the same
+instrument and duration, and playback just looks them up.  Notes that
+were not recorded are still rendered on the fly.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from music import Event
+from synth import Synth, AsyncSynth, StopScore, SAMPLERATE, render, run_score
+
+
+class RecordingSynth(Synth):
+    """A synth that logs the events of each play_mix instead of playing.
+
+    After the given number of phrases (play_mix calls) it stops the score.
+    """
+
+    def __init__(self, phrases=1):
+        super().__init__(output=None)
+        self.phrases = phrases
+        self.log = []
+
+    def play_mix(self, mix):
+        self.log.append([list(waves) for waves in mix])
+        if len(self.log) >= self.phrases:
+            raise StopScore
+
+
+class PrecompiledSynth(Synth):
+    """A synth that takes the prerendered notes from table."""
+
+    def __init__(self, output, table, rng=None, seed=None):
+        super().__init__(output, rng=rng, seed=seed)
+        self.table = table
+
+    def render(self, wave):
+        try:
+            return self.table[wave]
+        except (KeyError, TypeError):  # not recorded or not an event
+            return render(wave)
+
+
+class AsyncPrecompiledSynth(PrecompiledSynth, AsyncSynth):
+    """PrecompiledSynth for async scores."""
+
+
+def record(make_music, phrases=1):
+    """Run make_music for some phrases and return the events log."""
+    synth = RecordingSynth(phrases)
+    try:
+        run_score(make_music, synth)
+    except StopScore:
+        pass
+    return synth.log
+
+
+def unique_events(log):
+    """Return the set of the events in the log."""
+    return {wave for mix in log for waves in mix for wave in waves
+            if isinstance(wave, Event)}
+
+
+def prerender(events, batch_size=32, samplerate=SAMPLERATE):
+    """Render events and return a dict that maps them to their frames.
+
+    Notes with the same instrument and duration have the same length, so
+    they are rendered together, passing a column of frequencies to the
+    (uncached) instrument function.  Only instruments marked with
+    instruments.vectorized are batched; the others render note by note.
+    """
+    table = {}
+    batches = defaultdict(list)
+    for event in events:
+        if event.freq is None or not getattr(event.instrument, 'vectorized',
+                                             False):
+            table[event] = event.render()
+        else:
+            batches[event.instrument, event.duration].append(event)
+    for (instrument, duration), batch in batches.items():
+        for start in range(0, len(batch), batch_size):
+            chunk = batch[start:start+batch_size]
+            freqs = np.array([event.freq for event in chunk])[:, np.newaxis]
+            waves = instrument.__wrapped__(freqs, duration, samplerate)
+            for event, wave in zip(chunk, waves):
+                table[event] = wave
+    return table
+
+
+def precompile(make_music, phrases=16):
+    """Return the table of prerendered notes for the score."""
+    return prerender(unique_events(record(make_music, phrases)))
+
+
+if __name__ == '__main__':
+    import argparse
+    import inspect
+    from functools import partial
+    from synth import load_score, run_synth
+    parser = argparse.ArgumentParser(
+        description='Precompile a score and play it.')
+    parser.add_argument('score')
+    parser.add_argument('output', nargs='?')
+    parser.add_argument('--phrases', type=int, default=16,
+                        help='number of phrases to record')
+    args = parser.parse_args()
+    make_music = load_score(args.score)
+    table = precompile(make_music, args.phrases)
+    print(f'prerendered {len(table)} notes')
+    if inspect.iscoroutinefunction(make_music):
+        synth_class = AsyncPrecompiledSynth
+    else:
+        synth_class = PrecompiledSynth
+    run_synth(make_music, output=args.output,
+              synth_class=partial(synth_class, table=table))
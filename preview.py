@@ -0,0 +1,121 @@
+"""Deterministic, seekable rendering of scores.
+
+A phrase is what a score passes to a single play_mix() call.  A Synth
+created with a seed reseeds synth.random at the start of every phrase,
+from the seed and the phrase number, so the notes of a phrase don't
+depend on the random numbers drawn by the previous ones (noise tables
+are seeded too, see synth.noise_rng).  Renders made with the same seed
+by `synth.py --seed` or by server.py can be seeked here.
+
+To start from a later phrase, the score still runs from the beginning,
+but the phrases before the start are not rendered: their length is
+computed from the duration of their events.  Rendering from any phrase
+or timestamp is therefore bit-identical to the same part of a full
+render with the same seed, and skipping costs next to nothing.
+"""
+from synth import Synth, StopScore, SAMPLERATE, run_score
+
+
+def length(wave):
+    """Return the number of frames of a wave or event, without rendering."""
+    if hasattr(wave, 'render'):
+        return int(wave.duration * SAMPLERATE)
+    return len(wave)
+
+
+class PhraseSynth(Synth):
+    """A seeded synth that renders only part of a score.
+
+    Only the frames from start_frame to end_frame are rendered and sent
+    to the output (if any).  The score is stopped at end_frame, or at
+    the start of end_phrase.  self.index lists the phrases seen so far.
+    """
+
+    keep_index = True
+
+    def __init__(self, output, seed, start_frame=0, end_frame=None,
+                 end_phrase=None):
+        super().__init__(output, seed=seed)
+        self.start_frame, self.end_frame = start_frame, end_frame
+        self.end_phrase = end_phrase
+
+    def play_mix(self, mix):
+        mix = [list(waves) for waves in mix]
+        frames = max(sum(length(w) for w in waves) for waves in mix)
+        start = self.frame
+        if self.output is not None and start + frames > self.start_frame:
+            stop = frames
+            if self.end_frame is not None:
+                stop = min(stop, self.end_frame - start)
+            wave = self.mix(mix)
+            self.output.play_wave(wave[max(self.start_frame - start, 0):stop])
+        self.next_phrase(frames)
+        if self.end_frame is not None and self.frame >= self.end_frame:
+            raise StopScore
+        if self.end_phrase is not None and self.phrase >= self.end_phrase:
+            raise StopScore
+
+
+def run_phrases(make_music, synth):
+    """Run make_music with a PhraseSynth until it stops; return the index."""
+    try:
+        run_score(make_music, synth)
+    except StopScore:
+        pass
+    return synth.index
+
+
+def build_index(make_music, seed, duration=None, phrases=None):
+    """Return the index of the first phrases, or of `duration` seconds.
+
+    Nothing is rendered, so this is fast even for hours of music.  The
+    last entry is where the next phrase would start.
+    """
+    end_frame = None if duration is None else int(duration * SAMPLERATE)
+    synth = PhraseSynth(None, seed, end_frame=end_frame, end_phrase=phrases)
+    return run_phrases(make_music, synth)
+
+
+def render_preview(make_music, output, seed, start=0.0, duration=None,
+                   phrase=None):
+    """Render part of a score to output (anything with play_wave()).
+
+    The render starts at `start` seconds, or at the beginning of the
+    given phrase, and lasts `duration` seconds (until the score ends if
+    None).  Return the index of the phrases up to the end of the render.
+    """
+    if phrase is not None:
+        index = build_index(make_music, seed, phrases=phrase)
+        start_frame = index[phrase].start_frame
+    else:
+        start_frame = int(start * SAMPLERATE)
+    end_frame = None
+    if duration is not None:
+        end_frame = start_frame + int(duration * SAMPLERATE)
+    synth = PhraseSynth(output, seed, start_frame, end_frame)
+    return run_phrases(make_music, synth)
+
+
+if __name__ == '__main__':
+    import argparse
+    from synth import load_score, create_wav_file
+    parser = argparse.ArgumentParser(
+        description='Render part of a score, or print its phrase index.')
+    parser.add_argument('score')
+    parser.add_argument('output', nargs='?',
+                        help='wav file (print the index if omitted)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', type=float, default=0.0,
+                        help='start time in seconds')
+    parser.add_argument('--phrase', type=int, help='start phrase')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='seconds to render (or to index)')
+    args = parser.parse_args()
+    make_music = load_score(args.score)
+    if args.output is None:
+        for entry in build_index(make_music, args.seed, args.duration):
+            print(f'{entry.phrase:6}  {entry.start_frame / SAMPLERATE:10.3f}s')
+    else:
+        with create_wav_file(args.output) as synth:
+            render_preview(make_music, synth.output, args.seed, args.start,
+                           args.duration, args.phrase)
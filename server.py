@@ -0,0 +1,264 @@
+"""Render many generative scores concurrently in one process.
+
+Each stream is an instance of a score with its own seed and its own sink
+(a wav file or a local socket).  The seed reseeds the stream's random
+generator at every phrase, so any part of its output can be reproduced
+with preview.py.  The instruments' caches (and their noise tables) are
+shared by all the streams, and the notes
+are rendered by a pool of workers, in quanta of at most `quantum`
+seconds of audio.  The scheduler always runs first the quantum of the
+stream that has produced the least audio, so when the box is overloaded
+all the streams slow down together.
+
+Usage:
+    python server.py ezio0:1 ezio0:2 ezio3:3 --output out/{name}-{seed}.wav
+    python server.py ezio3:1 ezio3:2 --output unix:/tmp/{name}-{seed}.sock
+"""
+import time
+import wave
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from synth import AsyncSynth, Encoder, StopScore, SAMPLERATE, render
+
+
+class Scheduler:
+    """Run render jobs on a pool of workers, fairly among the streams."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers)
+        self.pending = []  # heap of (frames, count, stream, job, future)
+        self.running = 0
+        self.counter = itertools.count()
+
+    async def run(self, stream, job):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.pending, (stream.frames, next(self.counter),
+                                      stream, job, future))
+        self._dispatch()
+        return await future
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self.running < self.workers and self.pending:
+            *_, stream, job, future = heapq.heappop(self.pending)
+            self.running += 1
+            done = loop.run_in_executor(self.executor, timed, job)
+            done.add_done_callback(
+                lambda done, stream=stream, future=future:
+                    self._done(done, stream, future))
+
+    def _done(self, done, stream, future):
+        self.running -= 1
+        if future.cancelled():
+            pass
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            elapsed, result = done.result()
+            stream.render_time += elapsed
+            future.set_result(result)
+        self._dispatch()
+
+
+def timed(job):
+    start = time.perf_counter()
+    result = job()
+    return time.perf_counter() - start, result
+
+
+def quanta(events, quantum):
+    """Split events in chunks of at most quantum seconds (at least one)."""
+    chunk, duration = [], 0
+    for event in events:
+        if chunk and duration + event.duration > quantum:
+            yield chunk
+            chunk, duration = [], 0
+        chunk.append(event)
+        duration += event.duration
+    if chunk:
+        yield chunk
+
+
+class Stream:
+    """An instance of a score, with its statistics."""
+
+    def __init__(self, name, make_music, seed, output):
+        self.name, self.make_music, self.seed = name, make_music, seed
+        self.output = output
+        self.frames = 0        # frames produced so far
+        self.render_time = 0.0  # seconds spent by the workers
+        self.start_time = None
+
+    def __str__(self):
+        return f'{self.name}:{self.seed}'
+
+    @property
+    def audio_time(self):
+        return self.frames / SAMPLERATE
+
+    @property
+    def realtime_factor(self):
+        """Seconds of audio produced per second of wall-clock time."""
+        elapsed = time.monotonic() - self.start_time
+        return self.audio_time / elapsed if elapsed else 0.0
+
+    @property
+    def load(self):
+        """Seconds of work per second of audio (for one worker)."""
+        return self.render_time / self.audio_time if self.frames else 0.0
+
+
+class StreamSynth(AsyncSynth):
+    """An AsyncSynth that renders through the scheduler."""
+
+    def __init__(self, output, stream, scheduler, quantum, duration=None):
+        super().__init__(output, seed=stream.seed)
+        self.stream = stream
+        self.scheduler = scheduler
+        self.quantum = quantum
+        self.duration = duration
+        self.notes = {}  # the notes of the current phrase
+
+    def render(self, wave):
+        try:
+            return self.notes[wave]
+        except (KeyError, TypeError):  # not an event
+            return render(wave)
+
+    async def play_mix(self, mix):
+        mix = [list(waves) for waves in mix]
+        events = list(dict.fromkeys(wave for waves in mix for wave in waves
+                                    if hasattr(wave, 'render')))
+        # render the notes in quanta, then mix them
+        for chunk in quanta(events, self.quantum):
+            waves = await self.scheduler.run(
+                self.stream, lambda chunk=chunk: [render(e) for e in chunk])
+            self.notes.update(zip(chunk, waves))
+        try:
+            wave = await self.scheduler.run(self.stream,
+                                            lambda: self.mix(mix))
+        finally:
+            self.notes = {}
+        await self.output.play_wave(wave)
+        self.stream.frames += len(wave)
+        self.next_phrase(len(wave))
+        if self.duration is not None and self.stream.audio_time >= self.duration:
+            raise StopScore
+
+
+class WavSink:
+    def __init__(self, filename, samplerate=SAMPLERATE, dither=False):
+        self.encoder = Encoder(np.int16, dither=dither)
+        self.wf = wave.open(filename, 'wb')
+        self.wf.setnchannels(1)
+        self.wf.setsampwidth(2)
+        self.wf.setframerate(samplerate)
+
+    async def play_wave(self, data):
+        self.wf.writeframes(memoryview(self.encoder.encode(data)).cast('B'))
+
+    async def close(self):
+        self.wf.close()
+
+
+class SocketSink:
+    """Write 16-bit mono frames to a local (unix) socket."""
+
+    def __init__(self, writer, dither=False):
+        self.encoder = Encoder(np.int16, dither=dither)
+        self.writer = writer
+        # the transport may keep a reference to the frames we write, so
+        # drain() must wait until it's empty before we reuse the buffer
+        writer.transport.set_write_buffer_limits(0)
+
+    async def play_wave(self, data):
+        self.writer.write(memoryview(self.encoder.encode(data)).cast('B'))
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+@asynccontextmanager
+async def open_sink(output, dither=False):
+    if output.startswith('unix:'):
+        _, writer = await asyncio.open_unix_connection(output[len('unix:'):])
+        sink = SocketSink(writer, dither=dither)
+    else:
+        sink = WavSink(output, dither=dither)
+    try:
+        yield sink
+    finally:
+        await sink.close()
+
+
+async def run_stream(stream, scheduler, quantum, duration, dither):
+    async with open_sink(stream.output, dither) as sink:
+        synth = StreamSynth(sink, stream, scheduler, quantum, duration)
+        stream.start_time = time.monotonic()
+        try:
+            await stream.make_music(synth)
+        except StopScore:
+            pass
+
+
+async def report(streams, interval):
+    while True:
+        await asyncio.sleep(interval)
+        for stream in streams:
+            print(f'{stream!s:>12}  {stream.audio_time:8.1f}s  '
+                  f'realtime x{stream.realtime_factor:6.2f}  '
+                  f'load {stream.load:5.2f}')
+
+
+async def serve(streams, workers=4, quantum=1.0, duration=None,
+                report_interval=10.0, dither=False):
+    """Run the streams until they end (or forever)."""
+    scheduler = Scheduler(workers)
+    reporter = asyncio.create_task(report(streams, report_interval))
+    try:
+        await asyncio.gather(*(run_stream(stream, scheduler, quantum,
+                                          duration, dither)
+                               for stream in streams))
+    finally:
+        reporter.cancel()
+        scheduler.executor.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    import argparse
+    from synth import load_score
+    parser = argparse.ArgumentParser(
+        description='Render several scores concurrently.')
+    parser.add_argument('scores', nargs='+', metavar='SCORE[:SEED]')
+    parser.add_argument('--output', default='{name}-{seed}.wav',
+                        help='wav filename or unix:PATH, formatted with '
+                             'the name and seed of each stream')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--quantum', type=float, default=1.0,
+                        help='seconds of audio rendered per job')
+    parser.add_argument('--duration', type=float,
+                        help='seconds of audio to render per stream')
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    parser.add_argument('--dither', action='store_true',
+                        help='add TPDF dither to the 16-bit output')
+    args = parser.parse_args()
+    streams = []
+    for spec in args.scores:
+        name, _, seed = spec.partition(':')
+        seed = int(seed) if seed else len(streams)
+        output = args.output.format(name=name, seed=seed)
+        streams.append(Stream(name, load_score(name), seed, output))
+    try:
+        asyncio.run(serve(streams, args.workers, args.quantum, args.duration,
+                          args.report_interval, args.dither))
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,15 @@
 import wave
+import zlib
+import random
+import asyncio
+import inspect
 import threading
 
 from pathlib import Path
 from importlib import import_module
 from functools import lru_cache, partial
-from contextlib import contextmanager
+from collections import namedtuple
+from contextlib import contextmanager, asynccontextmanager
 
 import numpy as np
 import soundcard as sc
@@ -20,6 +25,72 @@ def sine_wave(duration, frequency, ampl=1.0, samplerate=SAMPLERATE):
     return (0.5 * ampl) * np.sin(x * frequency * np.pi * 2)
 
 
+def harmonic_wave(duration, frequency, harmonics, ampl=1.0,
+                  samplerate=SAMPLERATE, rolloff=0.9):
+    """Sum of sine partials (freqmult, amplmult) with anti-aliasing.
+
+    Partials above the Nyquist frequency are culled and never computed;
+    partials between ``rolloff * nyquist`` and nyquist are faded out
+    linearly, so notes don't click when a partial crosses the threshold.
+    """
+    nyquist = samplerate / 2
+    wave = sine_wave(duration, 0, 0, samplerate)
+    for fm, am in harmonics:
+        gain = partial_gain(frequency * fm, nyquist, rolloff)
+        if not np.any(gain):
+            continue
+        wave = wave + sine_wave(duration, frequency * fm, ampl * am * gain,
+                                samplerate)
+    return wave
+
+
+def partial_gain(frequency, nyquist, rolloff=0.9):
+    """Gain for a partial: 1 below the rolloff, 0 at/above nyquist."""
+    knee = rolloff * nyquist
+    return np.clip((nyquist - np.abs(frequency)) / (nyquist - knee), 0, 1)
+
+
+def _phase(duration, frequency, samplerate):
+    frames = int(duration * samplerate)
+    dt = frequency / samplerate
+    return np.mod(np.arange(frames) * dt, 1.0), dt
+
+
+def _polyblep(t, dt):
+    """PolyBLEP residual to subtract from a naive discontinuity at t=0."""
+    res = np.zeros_like(t)
+    before = t < dt
+    after = t > 1 - dt
+    x = t[before] / dt
+    res[before] = x + x - x * x - 1
+    x = (t[after] - 1) / dt
+    res[after] = x * x + x + x + 1
+    return res
+
+
+def saw_wave(duration, frequency, ampl=1.0, samplerate=SAMPLERATE):
+    """Band-limited (PolyBLEP) sawtooth."""
+    t, dt = _phase(duration, frequency, samplerate)
+    if dt >= 0.5:
+        return np.zeros(len(t))  # above nyquist
+    wave = 2 * t - 1
+    if dt:
+        wave -= _polyblep(t, dt)
+    return (0.5 * ampl) * wave
+
+
+def square_wave(duration, frequency, ampl=1.0, samplerate=SAMPLERATE):
+    """Band-limited (PolyBLEP) square wave."""
+    t, dt = _phase(duration, frequency, samplerate)
+    if dt >= 0.5:
+        return np.zeros(len(t))  # above nyquist
+    wave = np.where(t < 0.5, 1.0, -1.0)
+    if dt:
+        wave += _polyblep(t, dt)
+        wave -= _polyblep(np.mod(t + 0.5, 1.0), dt)
+    return (0.5 * ampl) * wave
+
+
 def release_time(atk, dcy, samplelen, samplerate=SAMPLERATE):
     return samplelen / samplerate * 1000 - (atk + dcy)
 
@@ -59,6 +130,11 @@ def envelope_ms(attack_time, decay_time, sustain_level, release_time, frames, sa
     ])[:frames]
 
 
+def noise_rng(*args):
+    """Return a generator seeded by args, so that noise is reproducible."""
+    return np.random.default_rng(zlib.crc32(repr(args).encode()))
+
+
 @lru_cache()
 def lowpass_noise(cutoff, duration, samplerate=SAMPLERATE):
     frames = int(duration*samplerate)
@@ -73,7 +149,8 @@ def lowpass_noise(cutoff, duration, samplerate=SAMPLERATE):
     # )
     # kernel = 2 * cutoff * np.sinc(2 * cutoff * t)
 
-    noise = np.random.normal(0, 0.2, frames)
+    rng = noise_rng('lowpass', cutoff, duration, samplerate)
+    noise = rng.normal(0, 0.2, frames)
     fd_noise = np.fft.rfft(noise)
     freq = np.fft.rfftfreq(noise.size, d=1/samplerate)
     print(len(freq[freq < cutoff]))
@@ -86,7 +163,8 @@ def lowpass_noise(cutoff, duration, samplerate=SAMPLERATE):
 @lru_cache()
 def bandpass_noise(cutoffl, cutoffh, duration, samplerate=SAMPLERATE):
     frames = int(duration*samplerate)
-    noise = np.random.normal(0, 0.2, frames)
+    rng = noise_rng('bandpass', cutoffl, cutoffh, duration, samplerate)
+    noise = rng.normal(0, 0.2, frames)
     fd_noise = np.fft.rfft(noise)
     freq = np.fft.rfftfreq(noise.size, d=1/samplerate)
     fd_noise[freq < cutoffl] = 0
@@ -95,26 +173,130 @@ def bandpass_noise(cutoffl, cutoffh, duration, samplerate=SAMPLERATE):
     return noise
 
 
+def render(wave):
+    """Return the frames of wave, rendering it first if it's an event."""
+    return wave.render() if hasattr(wave, 'render') else wave
+
+
+class StopScore(Exception):
+    """Raised by a synth to stop a score (scores usually loop forever)."""
+
+
+# rng_state is the state of synth.random at the start of the phrase
+Phrase = namedtuple('Phrase', 'phrase start_frame rng_state')
+
+
 class Synth:
-    def __init__(self, output):
+    """Mix the waves of a score and send them to output.
+
+    Scores take their random numbers from synth.random.  If a seed is
+    given, synth.random is reseeded at the start of every phrase (a
+    play_mix() call) from the seed and the phrase number, so that any
+    phrase can be rendered on its own, bit-identical (see preview.py).
+    """
+
+    keep_index = False  # keep a list of the Phrases in self.index
+
+    def __init__(self, output, rng=None, seed=None):
         self.output = output
+        self.seed = seed
+        if seed is not None:
+            rng = random.Random()
+        self.random = random if rng is None else rng
+        self.phrase = 0
+        self.frame = 0
+        self.index = [] if self.keep_index else None
+        self._start_phrase()
+
+    def _start_phrase(self):
+        if self.seed is not None:
+            self.random.seed(f'{self.seed}:{self.phrase}')
+        if self.index is not None:
+            self.index.append(Phrase(self.phrase, self.frame,
+                                     self.random.getstate()))
+
+    def next_phrase(self, frames):
+        """Move on to the next phrase, after `frames` frames."""
+        self.phrase += 1
+        self.frame += frames
+        self._start_phrase()
 
     def play(self, *args):
         self.play_mix(args)
 
-    def play_mix(self, mix):
-        concatenated = [np.concatenate(list(map(list, waves))) for waves in mix]
+    def render(self, wave):
+        return render(wave)
+
+    def mix(self, mix):
+        concatenated = [np.concatenate([self.render(w) for w in waves])
+                        for waves in mix]
         longest = len(max(concatenated, key=lambda x: len(x)))
         for idx, ary in enumerate(concatenated):
             zeros = np.zeros([longest-len(ary)])
             concatenated[idx] = np.block([ary, zeros])
+        return sum(concatenated)
 
-        self.output.play_wave(sum(concatenated))
+    def play_mix(self, mix):
+        wave = self.mix(mix)
+        self.output.play_wave(wave)
+        self.next_phrase(len(wave))
 
     def play_wave(self, wave):
         self.output.play_wave(wave)
 
 
+class AsyncSynth(Synth):
+    """A Synth for async scores, that await play_mix().
+
+    Mixing (and rendering the notes) runs in an executor, and the output
+    is an async sink whose play_wave() waits until it has buffer space,
+    so many streams can run in the same event loop.
+    """
+
+    def __init__(self, output, executor=None, rng=None, seed=None):
+        super().__init__(output, rng, seed)
+        self.executor = executor
+
+    async def play(self, *args):
+        await self.play_mix(args)
+
+    async def play_mix(self, mix):
+        loop = asyncio.get_running_loop()
+        wave = await loop.run_in_executor(self.executor, self.mix, list(mix))
+        await self.output.play_wave(wave)
+        self.next_phrase(len(wave))
+
+    async def play_wave(self, wave):
+        await self.output.play_wave(wave)
+
+
+class AsyncAdapter:
+    """Let an async score drive a synchronous synth."""
+
+    def __init__(self, synth):
+        self.synth = synth
+
+    def __getattr__(self, name):
+        return getattr(self.synth, name)
+
+    async def play(self, *args):
+        self.synth.play(*args)
+
+    async def play_mix(self, mix):
+        self.synth.play_mix(mix)
+
+    async def play_wave(self, wave):
+        self.synth.play_wave(wave)
+
+
+def run_score(make_music, synth):
+    """Run make_music with a synchronous synth, even if it's async."""
+    if inspect.iscoroutinefunction(make_music):
+        asyncio.run(make_music(AsyncAdapter(synth)))
+    else:
+        make_music(synth)
+
+
 class Queue0:
     """Bufferless Queue"""
 
@@ -149,13 +331,70 @@ class Queue0:
         return self.get()
 
 
+class FrameBuffers:
+    """A ring of reusable arrays, that grow when they are too short.
+
+    An array returned by get() is reused after `count` more calls.
+    """
+
+    def __init__(self, dtype, count=1):
+        self.arrays = [np.empty(0, dtype) for _ in range(count)]
+        self.index = 0
+
+    def get(self, frames):
+        array = self.arrays[self.index]
+        if len(array) < frames:
+            array = self.arrays[self.index] = np.empty(frames, array.dtype)
+        self.index = (self.index + 1) % len(self.arrays)
+        return array[:frames]
+
+
+class Encoder:
+    """Clip float frames to [-1, 1] and convert them for an output.
+
+    Frames are written into `out` (or into a reusable buffer), using
+    ufuncs with out= and reusable scratch arrays: once the buffers are
+    big enough, encoding allocates nothing.  int16 frames are scaled to
+    32767 (truncating, like np.int16) or, with dither, get a TPDF
+    dither of +-1 LSB and are rounded; float32 frames are just clipped.
+    """
+
+    def __init__(self, dtype=np.int16, buffers=1, dither=False, seed=None):
+        self.dtype = np.dtype(dtype)
+        self.buffers = FrameBuffers(self.dtype, buffers)
+        self.scratch = FrameBuffers(np.float64)
+        self.noise = FrameBuffers(np.float64)
+        self.rng = np.random.default_rng(seed) if dither else None
+
+    def encode(self, data, out=None):
+        if out is None:
+            out = self.buffers.get(len(data))
+        if self.dtype != np.int16:
+            return np.clip(data, -1, 1, out=out)
+        scratch = self.scratch.get(len(data))
+        if self.rng is None:
+            np.clip(data, -1, 1, out=scratch)
+            return np.multiply(scratch, 32767, out=out, casting='unsafe')
+        np.multiply(data, 32767, out=scratch)
+        noise = self.noise.get(len(data))
+        scratch += self.rng.random(out=noise)
+        scratch -= self.rng.random(out=noise)
+        np.clip(scratch, -32767, 32767, out=scratch)
+        # round, so that the dither linearizes the quantizer
+        np.rint(scratch, out=scratch)
+        np.copyto(out, scratch, casting='unsafe')
+        return out
+
+
 class SoundcardOutput:
     def __init__(self, speaker):
         self.speaker = speaker
         self.thread = None
+        # one buffer is being played while the next one is filled
+        self.encoder = Encoder(np.float32, buffers=2)
 
     def play_wave(self, wave):
-        self.queue.put(wave, interrupt_delay=0.1)
+        self.queue.put(self.encoder.encode(wave), interrupt_delay=0.1)
 
     def __enter__(self):
         if self.thread:
@@ -173,6 +412,69 @@ class SoundcardOutput:
             self.speaker.play(item)
 
 
+class AsyncSoundcardOutput:
+    """Async version of SoundcardOutput.
+
+    play_wave() waits while the queue is full, and a task feeds the
+    speaker from the queue, blocking an executor thread only while playing.
+    """
+
+    def __init__(self, speaker, maxsize=1):
+        self.speaker = speaker
+        self.maxsize = maxsize
+        self.task = None
+        # the queued buffers, the one being played and the one being filled
+        self.encoder = Encoder(np.float32, buffers=maxsize+2)
+
+    async def play_wave(self, wave):
+        await self._wait(self.queue.put(self.encoder.encode(wave)))
+
+    async def __aenter__(self):
+        if self.task:
+            raise RuntimeError("already running")
+        self.queue = asyncio.Queue(self.maxsize)
+        self.task = asyncio.create_task(self._feed())
+        return self
+
+    async def __aexit__(self, *args):
+        try:
+            await self._wait(self.queue.join())
+        finally:
+            self.task.cancel()
+
+    async def _wait(self, coro):
+        """Await coro, unless the feed task dies first: then raise its
+        exception, which would otherwise leave coro waiting forever."""
+        waiter = asyncio.ensure_future(coro)
+        await asyncio.wait({waiter, self.task},
+                           return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            if self.task.exception() is not None:
+                raise self.task.exception()
+            raise RuntimeError("the speaker feed stopped")
+        return waiter.result()
+
+    async def _feed(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            try:
+                await loop.run_in_executor(None, self.speaker.play, item)
+            finally:
+                self.queue.task_done()
+
+
+class AsyncOutput:
+    """Wrap a synchronous output that never blocks (e.g. MyBuffer)."""
+
+    def __init__(self, output):
+        self.output = output
+
+    async def play_wave(self, wave):
+        self.output.play_wave(wave)
+
+
 @contextmanager
 def open_sc_stream(samplerate=SAMPLERATE, buffer_duration=1.0):
     speaker = sc.default_speaker()
@@ -184,9 +486,29 @@ def open_sc_stream(samplerate=SAMPLERATE, buffer_duration=1.0):
             yield output
 
 
-class MyBuffer(bytearray):
+class MyBuffer:
+    """A growing buffer of 16-bit frames."""
+
+    def __init__(self, dither=False):
+        self.frames = np.empty(0, np.int16)
+        self.length = 0
+        self.encoder = Encoder(np.int16, dither=dither)
+
+    def __len__(self):
+        return self.length
+
     def play_wave(self, data):
-        self.extend(np.int16(np.clip(data, -1, 1) * 32767))
+        end = self.length + len(data)
+        if end > len(self.frames):
+            frames = np.empty(max(end, 2 * len(self.frames)), np.int16)
+            frames[:self.length] = self.frames[:self.length]
+            self.frames = frames
+        self.encoder.encode(data, out=self.frames[self.length:end])
+        self.length = end
+
+    def getbuffer(self):
+        """Return a memoryview of the bytes of the frames."""
+        return memoryview(self.frames[:self.length]).cast('B')
 
 
 def _write_wav_file(filename, sample_rate, stream):
@@ -195,25 +517,79 @@ def _write_wav_file(filename, sample_rate, stream):
         wf.setsampwidth(2)
         wf.setframerate(sample_rate)
         wf.setnframes(len(stream))
-        wf.writeframes(stream)
+        wf.writeframes(stream.getbuffer())
 
 
 @contextmanager
-def create_wav_file(filename, sample_rate=SAMPLERATE):
-    stream = MyBuffer()
+def create_wav_file(filename, sample_rate=SAMPLERATE, synth_class=Synth,
+                    dither=False, seed=None):
+    stream = MyBuffer(dither)
     try:
-        yield Synth(stream)
+        yield synth_class(stream, seed=seed)
     finally:
         _write_wav_file(filename, sample_rate, stream)
 
 
 @contextmanager
-def open_soundcard_synth(sample_rate=SAMPLERATE):
+def open_soundcard_synth(sample_rate=SAMPLERATE, synth_class=Synth,
+                         seed=None):
     with open_sc_stream() as stream:
-        yield Synth(stream)
+        yield synth_class(stream, seed=seed)
+
+
+@asynccontextmanager
+async def create_async_wav_file(filename, sample_rate=SAMPLERATE,
+                                synth_class=AsyncSynth, dither=False,
+                                seed=None):
+    stream = MyBuffer(dither)
+    try:
+        yield synth_class(AsyncOutput(stream), seed=seed)
+    finally:
+        _write_wav_file(filename, sample_rate, stream)
+
+
+@asynccontextmanager
+async def open_async_soundcard_synth(sample_rate=SAMPLERATE,
+                                     buffer_duration=1.0,
+                                     synth_class=AsyncSynth, seed=None):
+    speaker = sc.default_speaker()
+    blocksize = int(sample_rate * buffer_duration)
+    with speaker.player(samplerate=sample_rate, blocksize=blocksize) as player:
+        async with AsyncSoundcardOutput(player) as output:
+            yield synth_class(output, seed=seed)
+
+
+async def run_async_synth(callable, output=None, **kwargs):
+    if output is None:
+        context_function = open_async_soundcard_synth
+    elif isinstance(output, str):
+        context_function = partial(create_async_wav_file, output)
+    async with context_function(**kwargs) as synth:
+        await callable(synth)
+
+
+def run_streams(*streams):
+    """Run several async scores in the same event loop.
+
+    Each stream is a (callable, output) pair, like the arguments of
+    run_synth().
+    """
+    async def main():
+        await asyncio.gather(*(run_async_synth(callable, output)
+                               for callable, output in streams))
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
 
 
 def run_synth(callable, output=None, **kwargs):
+    if inspect.iscoroutinefunction(callable):
+        try:
+            asyncio.run(run_async_synth(callable, output, **kwargs))
+        except KeyboardInterrupt:
+            pass
+        return
     if output is None:
         context_function = open_soundcard_synth
     elif isinstance(output, str):
@@ -225,16 +601,22 @@ def run_synth(callable, output=None, **kwargs):
         pass
 
 
-if __name__ == "__main__":
-    # TODO: use argparse
-    import sys
-    outfile = None
-    if len(sys.argv) >= 2:
-        scorename = sys.argv[1]
-    if len(sys.argv) == 3:
-        outfile = sys.argv[2]
+def load_score(scorename):
+    """Return the make_music function of the score with the given name."""
     # TODO: handle multiple scores with the same name
     scorefile = next(f for f in Path('.').glob('**/*.py') if f.stem == scorename)
     # scores/ezio/ezio0.py -> scores.ezio.ezio0
     module = '.'.join([*scorefile.parent.parts, scorefile.stem])
-    run_synth(import_module(module).make_music, output=outfile)
+    return import_module(module).make_music
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Play or render a score.')
+    parser.add_argument('score')
+    parser.add_argument('output', nargs='?', help='wav file')
+    parser.add_argument('--seed', type=int,
+                        help='seed every phrase, to make the render '
+                             'reproducible and seekable (see preview.py)')
+    args = parser.parse_args()
+    run_synth(load_score(args.score), output=args.output, seed=args.seed)
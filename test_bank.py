@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from bank import SampleBank, BankSynth, export_bank
+from instruments import default_tone, kick
+from music import Event, play_sequence, play_drumbase
+
+
+@pytest.mark.parametrize(('dtype', 'tolerance'),
+                         [('int16', 1e-4), ('float16', 1e-3)])
+def test_bank_roundtrip(tmp_path, dtype, tolerance):
+    filename = tmp_path / 'test.bank'
+    count = export_bank(filename, instruments=[default_tone], drums=[kick],
+                        durations=[0.1, 0.25], freqs=[220.0, 440.0],
+                        dtype=dtype)
+    assert count == 6
+    bank = SampleBank(filename)
+    assert len(bank) == 6
+    assert (default_tone, 440.0, 0.25) in bank
+    assert (default_tone, 880.0, 0.25) not in bank
+    note = bank.get(default_tone, 440.0, 0.25)
+    assert note.dtype == np.float64
+    assert np.allclose(note, default_tone(440.0, 0.25), atol=tolerance)
+    drum = bank.get(kick, None, 0.1)
+    assert np.allclose(drum, kick(0.1), atol=tolerance)
+
+
+def test_bank_instrument_fallback(tmp_path):
+    filename = tmp_path / 'test.bank'
+    export_bank(filename, instruments=[default_tone], drums=[],
+                durations=[0.1], freqs=[440.0])
+    tone = SampleBank(filename).instrument(default_tone)
+    assert tone.__name__ == 'default_tone'
+    assert np.allclose(tone(440.0, 0.1), default_tone(440.0, 0.1), atol=1e-4)
+    assert np.array_equal(tone(880.0, 0.1), default_tone(880.0, 0.1))
+
+
+def test_bank_instrument_call_forms(tmp_path):
+    filename = tmp_path / 'test.bank'
+    export_bank(filename, instruments=[default_tone], drums=[kick],
+                durations=[0.1], freqs=[440.0])
+    bank = SampleBank(filename)
+    tone, drum = bank.instrument(default_tone), bank.instrument(kick)
+    expected = bank.get(default_tone, 440.0, 0.1)
+    assert np.array_equal(tone(440.0, 0.1, 44100), expected)
+    assert np.array_equal(tone(440.0, 0.1, samplerate=44100), expected)
+    expected = bank.get(kick, None, 0.1)
+    assert np.array_equal(drum(0.1, 44100), expected)
+    assert np.array_equal(drum(0.1, samplerate=44100), expected)
+    assert np.array_equal(drum(0.2, 44100), kick(0.2))
+
+
+def test_bank_synth(tmp_path):
+    filename = tmp_path / 'test.bank'
+    export_bank(filename, instruments=[default_tone], drums=[kick],
+                durations=[0.1], freqs=[440.0])
+    bank = SampleBank(filename)
+
+    class Output:
+        def play_wave(self, wave):
+            self.wave = wave
+    output = Output()
+    synth = BankSynth(output, bank)
+    # 880 Hz is not in the bank, so it's rendered as usual
+    mix = [play_sequence([(440.0, 0.1), (880.0, 0.1)]),
+           play_drumbase([1, 1], 0.1, kick)]
+    synth.play_mix(mix)
+    note = synth.render(Event(default_tone, 440.0, 0.1))
+    assert np.array_equal(note, bank.get(default_tone, 440.0, 0.1))
+    assert not np.array_equal(note, default_tone(440.0, 0.1))
+    expected = np.concatenate([bank.get(default_tone, 440.0, 0.1),
+                               default_tone(880.0, 0.1)])
+    expected += np.concatenate([bank.get(kick, None, 0.1)] * 2)
+    assert np.array_equal(output.wave, expected)
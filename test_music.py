@@ -1,6 +1,7 @@
+import numpy as np
 import pytest
 
-from music import Note, Scale
+from music import Note, Scale, notes, intervals, tunings, frequency_table
 
 major_scales = {
     'Cb': ['Cb', 'Db', 'Eb', 'Fb', 'Gb', 'Ab', 'Bb', 'Cb'],
@@ -55,7 +56,54 @@ other_scales = {
 other_scales = {scale: [Note(n) for n in notes]
                 for scale, notes in other_scales.items()}
 
-@pytest.mark.xfail
 @pytest.mark.parametrize(('scale', 'notes'), other_scales.items())
 def test_other_scales(scale, notes):
     assert Scale('C', scale, mode=1).notes == notes
+
+
+@pytest.mark.parametrize('name', notes)
+def test_get_freq_matches_notes(name):
+    note, octave = Note(name[:-1]), int(name[-1])
+    assert note.get_freq(octave) == notes[name]
+
+
+def test_midi_numbers():
+    assert Note('A').midi(4) == 69
+    assert Note('C').midi(-1) == 0
+    assert Note('Cb').midi(5) == Note('B').midi(4)
+    assert Note('B#').midi(4) == Note('C').midi(5)
+
+
+@pytest.mark.parametrize('tuning', tunings)
+def test_frequency_table(tuning):
+    table = frequency_table(tuning)
+    assert len(table) == 128
+    assert table[69] == pytest.approx(440.0)
+    assert np.allclose(table[12:] / table[:-12], 2.0)
+    assert np.all(np.diff(table) > 0)
+
+
+def test_pythagorean_fifth():
+    table = frequency_table('pythagorean')
+    assert table[Note('G').midi(4)] / table[Note('C').midi(4)] == pytest.approx(3/2)
+
+
+@pytest.mark.parametrize('scale', intervals)
+def test_scale_get_freqs(scale):
+    scale = Scale('D', scale)
+    freqs = scale.get_freqs([3, 4])
+    assert freqs.shape == (2, len(scale.notes))
+    assert list(freqs[1]) == [note.get_freq(4) for note in scale]
+    assert list(scale.get_freqs(3)) == list(freqs[0])
+
+
+def test_midi_out_of_range():
+    with pytest.raises(ValueError):
+        Note('C').get_freq(-2)
+    with pytest.raises(ValueError):
+        Note('A').get_freq(10)
+    with pytest.raises(ValueError):
+        Scale('Cb', 'major').get_freqs(-1)
+    with pytest.raises(ValueError):
+        Scale('C', 'major').get_freqs([4, 9])
+    assert Note('G').midi(9) == 127
@@ -0,0 +1,50 @@
+from functools import lru_cache
+
+import numpy as np
+
+from music import Event, play_sequence, play_drumbase
+from instruments import violin, snare
+from precompile import (PrecompiledSynth, record, unique_events, precompile,
+                        prerender)
+
+
+def make_music(synth):
+    while True:
+        synth.play_mix([
+            play_sequence([(440, 0.1), (660, 0.1), (440, 0.2)], violin),
+            play_drumbase([1, 0, 1, 0], 0.1, snare),
+        ])
+
+
+def test_record():
+    log = record(make_music, phrases=3)
+    assert len(log) == 3
+    assert len(unique_events(log)) == 5
+
+
+def test_precompiled_synth():
+    table = precompile(make_music, phrases=1)
+    for event, wave in table.items():
+        assert np.array_equal(wave, event.render())
+
+    class Output:
+        def play_wave(self, wave):
+            self.wave = wave
+    output = Output()
+    mix = [play_sequence([(440, 0.1), (880, 0.1)], violin)]
+    PrecompiledSynth(output, table).play_mix(mix)
+    expected = np.concatenate([violin(440, 0.1), violin(880, 0.1)])
+    assert np.array_equal(output.wave, expected)
+
+
+def test_prerender_scalar_instrument():
+    @lru_cache()
+    def scalar_tone(freq, duration, samplerate=44100):
+        return violin(float(freq), duration, samplerate)
+
+    events = {Event(scalar_tone, 440.0, 0.1), Event(scalar_tone, 880.0, 0.1),
+              Event(violin, 440.0, 0.1), Event(violin, 880.0, 0.1)}
+    table = prerender(events)
+    assert set(table) == events
+    for event, wave in table.items():
+        assert np.allclose(wave, event.render())
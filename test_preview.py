@@ -0,0 +1,70 @@
+import asyncio
+import wave
+
+import numpy as np
+
+from preview import build_index, render_preview
+from server import Stream, serve
+from synth import Encoder, run_synth
+from scores.ezio import ezio0, ezio3
+
+
+class Output:
+    def __init__(self):
+        self.waves = []
+
+    def play_wave(self, wave):
+        self.waves.append(wave)
+
+    @property
+    def frames(self):
+        return np.concatenate(self.waves)
+
+
+def test_build_index():
+    index = build_index(ezio3.make_music, seed=1, phrases=4)
+    assert [entry.phrase for entry in index] == [0, 1, 2, 3, 4]
+    assert index[0].start_frame == 0
+    assert all(a.start_frame < b.start_frame for a, b in zip(index, index[1:]))
+    assert build_index(ezio3.make_music, seed=1, phrases=4) == index
+    assert build_index(ezio3.make_music, seed=2, phrases=4) != index
+
+
+def test_seek_is_bit_identical():
+    full = Output()
+    index = render_preview(ezio0.make_music, full, seed=3, duration=20)
+    full = full.frames
+    assert len(full) == 20 * 44100
+
+    from_phrase = Output()
+    render_preview(ezio0.make_music, from_phrase, seed=3, phrase=2,
+                   duration=2)
+    start = index[2].start_frame
+    assert np.array_equal(from_phrase.frames, full[start:start + 2 * 44100])
+
+    from_time = Output()
+    render_preview(ezio0.make_music, from_time, seed=3, start=12.5,
+                   duration=3)
+    start = int(12.5 * 44100)
+    assert np.array_equal(from_time.frames, full[start:start + 3 * 44100])
+
+
+def test_server_output_can_be_previewed(tmp_path):
+    stream = Stream('ezio0', ezio0.make_music, 1, str(tmp_path / 'out.wav'))
+    asyncio.run(serve([stream], workers=2, duration=10))
+    with wave.open(stream.output) as wf:
+        served = wf.readframes(wf.getnframes())[:2 * 10 * 44100]
+    preview = Output()
+    render_preview(ezio0.make_music, preview, seed=1, duration=10)
+    assert Encoder().encode(preview.frames).tobytes() == served
+
+
+def test_seeded_synth_output_can_be_previewed(tmp_path):
+    filename = str(tmp_path / 'out.wav')
+    run_synth(ezio3.make_music, filename, seed=2)
+    with wave.open(filename) as wf:
+        rendered = wf.readframes(wf.getnframes())
+    preview = Output()
+    index = render_preview(ezio3.make_music, preview, seed=2, phrase=3)
+    start = index[3].start_frame
+    assert Encoder().encode(preview.frames).tobytes() == rendered[2 * start:]
@@ -0,0 +1,52 @@
+import asyncio
+import wave
+
+from music import Event, play_sequence
+from instruments import default_tone
+from server import Stream, serve, quanta
+
+
+async def make_music(synth):
+    rng = synth.random
+    while True:
+        sequence = [(rng.choice([220, 330, 440]), 0.1) for x in range(4)]
+        await synth.play_mix([play_sequence(sequence)])
+
+
+def read_frames(filename):
+    with wave.open(filename) as wf:
+        return wf.readframes(wf.getnframes())
+
+
+def test_quanta():
+    events = [Event(default_tone, 440, d) for d in (0.5, 0.5, 0.25, 2, 0.1)]
+    assert [len(chunk) for chunk in quanta(events, 1.0)] == [2, 1, 1, 1]
+
+
+def test_serve(tmp_path):
+    streams = [Stream('test', make_music, seed, str(tmp_path / f'{n}.wav'))
+               for n, seed in enumerate([1, 2, 1])]
+    asyncio.run(serve(streams, workers=2, quantum=0.2, duration=1.0))
+    for stream in streams:
+        assert stream.audio_time >= 1.0
+        assert stream.realtime_factor > 0
+    frames = [read_frames(stream.output) for stream in streams]
+    assert frames[0] == frames[2]
+    assert frames[0] != frames[1]
+
+
+def test_mix_uses_rendered_quanta(tmp_path):
+    rendered = []
+    def counting_tone(freq, duration):
+        rendered.append(freq)
+        return default_tone(freq, duration)
+
+    async def repeated_notes(synth):
+        while True:
+            sequence = [(440, 0.1)] * 4 + [(330, 0.1)]
+            await synth.play_mix([play_sequence(sequence, counting_tone)])
+
+    stream = Stream('test', repeated_notes, 1, str(tmp_path / 'test.wav'))
+    asyncio.run(serve([stream], workers=1, quantum=0.1, duration=0.5))
+    # each note is rendered once, by a quantum job, and not by the mix
+    assert sorted(rendered) == [330, 440]
@@ -0,0 +1,144 @@
+import wave
+import asyncio
+
+import numpy as np
+import pytest
+
+from music import play_sequence
+from instruments import default_tone
+from synth import (Synth, AsyncSynth, AsyncSoundcardOutput, Encoder, MyBuffer,
+                   harmonic_wave, sine_wave, saw_wave, square_wave,
+                   run_score, run_streams)
+
+
+def test_harmonic_wave_below_nyquist():
+    harmonics = [(1.0, 0.5), (2.0, 0.25)]
+    expected = (sine_wave(0.1, 440, 0.5) + sine_wave(0.1, 880, 0.25))
+    assert np.allclose(harmonic_wave(0.1, 440, harmonics), expected)
+
+
+def test_harmonic_wave_culls_above_nyquist():
+    harmonics = [(1.0, 0.5), (4.0, 0.5)]
+    # 4 * 8000 Hz is above the nyquist frequency of 22050 Hz
+    expected = sine_wave(0.1, 8000, 0.5)
+    assert np.allclose(harmonic_wave(0.1, 8000, harmonics), expected)
+
+
+@pytest.mark.parametrize('oscillator', [saw_wave, square_wave])
+def test_polyblep_oscillators(oscillator):
+    samples = oscillator(0.5, 440)
+    assert len(samples) == int(0.5 * 44100)
+    assert np.max(np.abs(samples)) <= 0.5 * 1.01
+    assert abs(np.mean(samples)) < 0.01
+    assert not np.any(oscillator(0.1, 30000))
+
+
+async def two_notes(synth):
+    for freq in (440, 880):
+        await synth.play_mix([play_sequence([(freq, 0.1)])])
+
+
+def test_async_synth():
+    class Output:
+        async def play_wave(self, wave):
+            self.waves.append(wave)
+    output = Output()
+    output.waves = []
+    asyncio.run(two_notes(AsyncSynth(output)))
+    assert len(output.waves) == 2
+    assert np.array_equal(output.waves[1], default_tone(880, 0.1))
+
+
+def test_run_streams(tmp_path):
+    filenames = [str(tmp_path / f'{n}.wav') for n in range(3)]
+    run_streams(*[(two_notes, filename) for filename in filenames])
+    for filename in filenames:
+        with wave.open(filename) as wf:
+            assert wf.getnframes() == 2 * int(0.1 * 44100)
+
+
+def test_run_score_async():
+    class Output:
+        def play_wave(self, wave):
+            self.waves.append(wave)
+    output = Output()
+    output.waves = []
+    run_score(two_notes, Synth(output))
+    assert len(output.waves) == 2
+
+
+def test_encoder_int16():
+    data = np.linspace(-1.5, 1.5, 1001)
+    encoder = Encoder()
+    out = encoder.encode(data)
+    assert out.dtype == np.int16
+    assert np.array_equal(out, np.int16(np.clip(data, -1, 1) * 32767))
+    # the buffers are reused
+    assert np.shares_memory(encoder.encode(data[:500]), out)
+
+
+def test_encoder_dither():
+    data = np.full(10000, 0.25)
+    out = Encoder(dither=True, seed=0).encode(data)
+    assert np.all(np.abs(out.astype(float) - 0.25 * 32767) <= 2)
+    assert len(np.unique(out)) > 1
+
+
+@pytest.mark.parametrize('lsb', [0.0, 0.3, 0.7, -0.3, 2.3])
+def test_encoder_dither_preserves_mean(lsb):
+    data = np.full(200000, lsb / 32767)
+    out = Encoder(dither=True, seed=0).encode(data)
+    assert abs(out.mean() - lsb) < 0.02
+    assert np.any(out)  # even silence gets dithered
+
+
+def test_encoder_float32():
+    data = np.linspace(-1.5, 1.5, 101)
+    out = Encoder(np.float32).encode(data)
+    assert out.dtype == np.float32
+    assert np.array_equal(out, np.clip(data, -1, 1).astype(np.float32))
+
+
+def test_my_buffer():
+    buffer = MyBuffer()
+    waves = [np.linspace(-1, 1, n) for n in (10, 1000, 3)]
+    for data in waves:
+        buffer.play_wave(data)
+    assert len(buffer) == 1013
+    expected = np.int16(np.clip(np.concatenate(waves), -1, 1) * 32767)
+    assert bytes(buffer.getbuffer()) == expected.tobytes()
+
+
+def test_async_soundcard_output_error():
+    class Speaker:
+        def __init__(self):
+            self.played = 0
+        def play(self, data):
+            self.played += 1
+            if self.played == 2:
+                raise OSError('device lost')
+
+    async def play():
+        async with AsyncSoundcardOutput(Speaker()) as output:
+            for _ in range(10):
+                await output.play_wave(np.zeros(100))
+
+    with pytest.raises(OSError, match='device lost'):
+        asyncio.run(asyncio.wait_for(play(), timeout=5))
+
+
+def test_async_soundcard_output():
+    class Speaker:
+        def __init__(self):
+            self.frames = 0
+        def play(self, data):
+            self.frames += len(data)
+
+    async def play(speaker):
+        async with AsyncSoundcardOutput(speaker) as output:
+            for _ in range(5):
+                await output.play_wave(np.zeros(100))
+
+    speaker = Speaker()
+    asyncio.run(asyncio.wait_for(play(speaker), timeout=5))
+    assert speaker.frames == 500